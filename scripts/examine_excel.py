@@ -1,48 +1,111 @@
 #!/usr/bin/env python3
+import openpyxl
 import pandas as pd
+from pandas.io.parsers import TextParser
 import sys
 
+# Rows shown per sheet and non-empty values shown per column
+HEAD_ROWS = 5
+SAMPLE_VALUES = 3
+
+def excel_value(value):
+    """Convert a cell value the way pd.read_excel does before type inference"""
+    if value is None:
+        return ''
+    # Excel stores every number as a float; whole ones are read as ints
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+def sample_rows(rows, width):
+    """
+    Keep the first HEAD_ROWS rows plus, for every column, the rows holding its
+    first SAMPLE_VALUES non-empty cells and its first empty one
+    A column is no longer checked once it has all of those. Returns the kept
+    rows, in sheet order and converted with excel_value, and the row count.
+    """
+    values_needed = [SAMPLE_VALUES] * width
+    empty_seen = [False] * width
+    open_cols = list(range(width))
+    kept, total_rows = [], 0
+    for row in rows:
+        total_rows += 1
+        keep = total_rows <= HEAD_ROWS
+        done = False
+        for col in open_cols:
+            value = row[col] if col < len(row) else None
+            if value is None or value == '':
+                if empty_seen[col]:
+                    continue
+                empty_seen[col] = True
+            elif values_needed[col]:
+                values_needed[col] -= 1
+            else:
+                continue
+            keep = True
+            done = done or (empty_seen[col] and not values_needed[col])
+        if done:
+            open_cols = [col for col in open_cols
+                         if values_needed[col] or not empty_seen[col]]
+        if keep:
+            kept.append([excel_value(value) for value in row])
+    return kept, total_rows
+
 def examine_excel_file(file_path):
     """Examine the structure of the Excel file"""
     print(f"Examining Excel file: {file_path}\n")
     
-    # Load the Excel file
-    xl_file = pd.ExcelFile(file_path)
+    # Load the Excel file lazily; read-only mode streams rows on demand
+    # instead of parsing every sheet into memory up front
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
     
     # List all sheet names
     print("Available sheets:")
-    for i, sheet_name in enumerate(xl_file.sheet_names):
+    for i, sheet_name in enumerate(workbook.sheetnames):
         print(f"  {i+1}. {sheet_name}")
     
     print("\n" + "="*80 + "\n")
     
     # Examine each sheet
-    for sheet_name in xl_file.sheet_names:
+    for sheet_name in workbook.sheetnames:
         print(f"Sheet: {sheet_name}")
         print("-" * 40)
         
-        # Read the sheet
-        df = pd.read_excel(xl_file, sheet_name=sheet_name)
+        # Stream the sheet, keeping only the header and the rows that are
+        # shown or sampled. The MTX export declares a bogus A1 dimension, so
+        # it is reset and the row count comes from the streaming pass instead.
+        ws = workbook[sheet_name]
+        ws.reset_dimensions()
+        rows = ws.iter_rows(values_only=True)
+        header = [excel_value(value) for value in next(rows, ())]
+        kept, total_rows = sample_rows(rows, len(header))
+        # Parsed as pd.read_excel would, blank headers becoming 'Unnamed: N'.
+        # The kept rows hold each column's first values and first gap, so
+        # the sample values are exact; the dtypes only miss types that first
+        # appear further down a column. An empty sheet has nothing to parse.
+        df = TextParser([header] + kept, header=0).read() if header else pd.DataFrame()
         
         # Basic info
-        print(f"Shape: {df.shape} (rows: {df.shape[0]}, columns: {df.shape[1]})")
-        print(f"\nColumn names:")
-        for col in df.columns:
-            print(f"  - {col} ({df[col].dtype})")
+        shape = (total_rows, len(header))
+        print(f"Shape: {shape} (rows: {shape[0]}, columns: {shape[1]})")
+        print(f"\nColumn names (dtypes from {len(df)} sampled rows):")
+        for col, dtype in df.dtypes.items():
+            print(f"  - {col} ({dtype})")
         
         # Show first few rows
-        print(f"\nFirst 5 rows:")
-        print(df.head())
+        print(f"\nFirst {HEAD_ROWS} rows:")
+        print(df.head(HEAD_ROWS))
         
         # Show sample values for each column
         print(f"\nSample values for each column:")
-        for col in df.columns:
-            non_null_values = df[col].dropna()
-            if len(non_null_values) > 0:
-                sample_values = non_null_values.head(3).tolist()
+        samples = {col: values.dropna().head(SAMPLE_VALUES).tolist() for col, values in df.items()}
+        for col, sample_values in samples.items():
+            if sample_values:
                 print(f"  {col}: {sample_values}")
         
         print("\n" + "="*80 + "\n")
+    
+    workbook.close()
 
 if __name__ == "__main__":
     examine_excel_file("/Users/davidfoster/Dev/catalogue-browser/MTX_16.2.xlsx")
\ No newline at end of file
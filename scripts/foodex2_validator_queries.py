@@ -3,112 +3,706 @@
 FoodEx2 Validator Query Functions
 This module provides the key database queries needed for validating FoodEx2 codes
 """
+import atexit
+import os
 import sqlite3
 import re
-from typing import Dict, List, Tuple, Optional, Set
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from types import MappingProxyType
+from typing import Callable, Dict, Iterable, List, Mapping, Tuple, Optional, Set
+
+# SQLite's default SQLITE_MAX_VARIABLE_NUMBER on older builds is 999
+_IN_CHUNK_SIZE = 900
+
+# The schema pieces below are shared with import_mtx_to_sqlite.py, which
+# builds them at import time; the validator only creates what is missing.
+
+# Composite indexes backing the hot lookups; the (term_code, hierarchy_code)
+# ones also cover the closure build and the descriptor ORDER BY
+LOOKUP_INDEXES = (
+    ('idx_terms_code_depr', 'terms(term_code, deprecated)'),
+    ('idx_attr_code_depr', 'attributes(code, deprecated)'),
+    ('idx_th_term_hier_parent', 'term_hierarchies(term_code, hierarchy_code, parent_code)'),
+    ('idx_th_hier_order', 'term_hierarchies(hierarchy_code, term_order, term_code)'),
+)
+
+# Full-text index over term names, kept in sync with terms by triggers.
+# term_code is indexed too so code prefixes (e.g. "A01D") are searchable.
+FTS_SCHEMA = (
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS terms_fts USING fts5(
+        term_code, extended_name, common_names, scientific_names,
+        content='terms', tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS terms_fts_ai AFTER INSERT ON terms BEGIN
+        INSERT INTO terms_fts(rowid, term_code, extended_name, common_names, scientific_names)
+        VALUES (new.rowid, new.term_code, new.extended_name, new.common_names, new.scientific_names);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS terms_fts_ad AFTER DELETE ON terms BEGIN
+        INSERT INTO terms_fts(terms_fts, rowid, term_code, extended_name, common_names, scientific_names)
+        VALUES ('delete', old.rowid, old.term_code, old.extended_name, old.common_names, old.scientific_names);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS terms_fts_au AFTER UPDATE ON terms BEGIN
+        INSERT INTO terms_fts(terms_fts, rowid, term_code, extended_name, common_names, scientific_names)
+        VALUES ('delete', old.rowid, old.term_code, old.extended_name, old.common_names, old.scientific_names);
+        INSERT INTO terms_fts(rowid, term_code, extended_name, common_names, scientific_names)
+        VALUES (new.rowid, new.term_code, new.extended_name, new.common_names, new.scientific_names);
+    END
+    """,
+    "INSERT INTO terms_fts(terms_fts) VALUES ('rebuild')",
+)
+
+# Splits new.implicit_facets the way parse_implicit_facets does: entries
+# are '$'-separated, the code runs to the first '.', and entries without a
+# '.' are skipped
+_SPLIT_IMPLICIT_FACETS = """
+        INSERT OR IGNORE INTO implicit_facets
+        WITH RECURSIVE split(entry, rest, n) AS (
+            SELECT NULL, new.implicit_facets || '$', 0
+            UNION ALL
+            SELECT substr(rest, 1, instr(rest, '$') - 1),
+                   substr(rest, instr(rest, '$') + 1), n + 1
+            FROM split WHERE rest != ''
+        )
+        SELECT new.term_code,
+               substr(entry, 1, instr(entry, '.') - 1),
+               substr(entry, instr(entry, '.') + 1),
+               row_number() OVER (ORDER BY n) - 1
+        FROM split WHERE instr(entry, '.') > 0
+        ORDER BY n;
+"""
+
+# Implicit facets pre-split into one row per (term, facet, descriptor),
+# kept in sync with terms by triggers; facet_order keeps the order they
+# appear in terms.implicit_facets
+IMPLICIT_FACETS_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS implicit_facets (
+        term_code TEXT,
+        facet_code TEXT,
+        descriptor_code TEXT,
+        facet_order INTEGER,
+        PRIMARY KEY (term_code, facet_code, descriptor_code)
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS implicit_facets_ai AFTER INSERT ON terms BEGIN
+        {_SPLIT_IMPLICIT_FACETS}
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS implicit_facets_ad AFTER DELETE ON terms BEGIN
+        DELETE FROM implicit_facets WHERE term_code = old.term_code;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS implicit_facets_au
+    AFTER UPDATE OF term_code, implicit_facets ON terms BEGIN
+        DELETE FROM implicit_facets WHERE term_code = old.term_code;
+        {_SPLIT_IMPLICIT_FACETS}
+    END
+    """,
+)
+
+# Column order of _sql_get_facet_descriptors rows
+_DESCRIPTOR_FIELDS = ('term_code', 'extended_name', 'deprecated')
+
+_FACET_RE = re.compile(r'([A-Z0-9]+)\.([A-Z0-9]+)')
+# A facets string made only of well-formed pairs, e.g. F01.A059P$F27.A000A
+_FACETS_PATTERN = r'[A-Z0-9]+\.[A-Z0-9]+(?:\$[A-Z0-9]+\.[A-Z0-9]+)*'
+_FACETS_RE = re.compile(_FACETS_PATTERN)
+# A complete well-formed code, e.g. A01DJ#F28.A07JV$F01.A059P
+_CODE_RE = re.compile(rf'(?P<base>[A-Z0-9]+)(?:#(?P<facets>{_FACETS_PATTERN}))?')
+
+
+def _split_facets(facets_str: str) -> List[Tuple[str, Optional[str]]]:
+    """
+    Split a facets string into (facet_code, descriptor_code) pairs
+    Entries without a '.' are returned as (entry, None).
+    """
+    # Well-formed strings (the common case) are parsed by the regex engine
+    # in one pass; anything else goes through the entry-by-entry fallback.
+    if _FACETS_RE.fullmatch(facets_str):
+        return _FACET_RE.findall(facets_str)
+    
+    pairs = []
+    for facet_pair in facets_str.split('$'):
+        facet_code, sep, descriptor_code = facet_pair.partition('.')
+        pairs.append((facet_code, descriptor_code) if sep else (facet_pair, None))
+    return pairs
+
+
+def _parse_code(code: str) -> Tuple[str, List[Tuple[str, Optional[str]]]]:
+    """Split a FoodEx2 code into its base term and (facet, descriptor) pairs"""
+    match = _CODE_RE.fullmatch(code)
+    if match:
+        facets_str = match.group('facets')
+        return match.group('base'), _FACET_RE.findall(facets_str) if facets_str else []
+    
+    # Malformed codes keep the entry-by-entry parse for precise error messages
+    base_code, _, facets_str = code.partition('#')
+    return base_code, _split_facets(facets_str) if facets_str else []
+
+
+def _columns(cursor: sqlite3.Cursor) -> Tuple[str, ...]:
+    """Column names of the cursor's current result set"""
+    return tuple(description[0] for description in cursor.description)
+
+
+# Runs of letters and digits, which is what the unicode61 tokenizer indexes;
+# punctuation and '_' only separate tokens
+_WORD_RE = re.compile(r'[^\W_]+')
+
+
+def _fts_prefix_query(query: str) -> str:
+    """
+    Turn free text into an FTS5 query matching every word as a prefix
+    Returns '' when the text has no indexable words, e.g. '-', so the
+    caller can fall back to a LIKE search.
+    """
+    return ' '.join(f'"{word}"*' for word in _WORD_RE.findall(query))
+
+
+@lru_cache(maxsize=8192)
+def parse_implicit_facets(implicit_facets: Optional[str]) -> Tuple[Tuple[str, str], ...]:
+    """Parse an implicit facets string into (facet_code, descriptor_code) pairs"""
+    # Pure and cached: the same implicit facets string recurs across many terms
+    if not implicit_facets:
+        return ()
+    # Parse format: F01.A059P$F27.A000A$F33.A0C4A
+    return tuple((facet_code, descriptor_code)
+                 for facet_code, descriptor_code in _split_facets(implicit_facets)
+                 if descriptor_code is not None)
+
+class _SharedConnection:
+    """A pooled connection plus the state that was set up on it once"""
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        # Serialises the few statements that write (closure build, batch
+        # read transactions); plain lookups need no locking
+        self.lock = threading.RLock()
+        self.has_fts = False
+        self.has_implicit_facets = False
+        self.closure_hierarchies = set()
+
+
+# One connection per (database file, read_only), shared by every
+# FoodEx2Database instance in the process
+_CONN_CACHE: Dict[Tuple[str, bool], _SharedConnection] = {}
+_CONN_CACHE_LOCK = threading.Lock()
+
+
+def close_shared_connections():
+    """Close all pooled connections, e.g. at process shutdown"""
+    with _CONN_CACHE_LOCK:
+        for (_, read_only), shared in _CONN_CACHE.items():
+            if not read_only:
+                # Let SQLite refresh planner statistics gathered over this session
+                shared.conn.execute("PRAGMA query_only=OFF")
+                shared.conn.execute("PRAGMA optimize")
+            shared.conn.close()
+        _CONN_CACHE.clear()
+
+
+# Pooled connections outlive the instances using them, so this is the only
+# point at which PRAGMA optimize gets to run
+atexit.register(close_shared_connections)
+
 
 class FoodEx2Database:
-    def __init__(self, db_path: str):
+    """
+    FoodEx2 lookups over a pooled SQLite connection
+    Instances for the same database file share one connection, so creating
+    one per request is cheap. The connection is opened with
+    check_same_thread=False: lookups are plain reads, which sqlite3
+    serialises internally, and the few writes it makes go through a lock.
+    """
+    def __init__(self, db_path: str, read_only: bool = False):
         self.db_path = db_path
-        self.conn = sqlite3.connect(db_path)
-        self.conn.row_factory = sqlite3.Row
+        self.read_only = read_only
+        self._init_sql()
+        
+        key = (os.path.abspath(db_path), read_only)
+        with _CONN_CACHE_LOCK:
+            shared = _CONN_CACHE.get(key)
+            if shared is None:
+                shared = _CONN_CACHE[key] = self._open_shared(db_path, read_only)
+        self._shared = shared
+        self.conn = shared.conn
+        self.has_fts = shared.has_fts
+        self.has_implicit_facets = shared.has_implicit_facets
+        self._init_caches()
+    
+    def _open_shared(self, db_path: str, read_only: bool) -> _SharedConnection:
+        """Open a connection and run the one-time setup on it"""
+        # sqlite3 keeps an LRU of prepared statements keyed on the exact SQL
+        # text, so every query is issued from a fixed string attribute.
+        # isolation_level=None: no implicit transactions, see _transaction().
+        if read_only:
+            # immutable=1 tells SQLite the file cannot change underneath us,
+            # so it skips locking and change detection altogether. as_uri()
+            # percent-encodes the path, which may contain '#' or '?'.
+            uri = Path(db_path).resolve().as_uri()
+            conn = sqlite3.connect(f"{uri}?mode=ro&immutable=1", uri=True,
+                                   cached_statements=256, check_same_thread=False,
+                                   isolation_level=None)
+        else:
+            conn = sqlite3.connect(db_path, cached_statements=256,
+                                   check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        shared = _SharedConnection(conn)
+        self.conn = conn
+        
+        if not read_only:
+            self._ensure_indexes()
+            self._ensure_fts()
+        shared.has_fts = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'terms_fts'").fetchone() is not None
+        shared.has_implicit_facets = self._implicit_facets_current()
+        if not shared.has_implicit_facets and not read_only:
+            self._build_implicit_facets()
+            shared.has_implicit_facets = True
+        self._init_closure()
+        self._apply_pragmas()
+        return shared
+    
+    @contextmanager
+    def _transaction(self):
+        """Run the enclosed statements in one explicit transaction"""
+        self.conn.execute("BEGIN")
+        try:
+            yield
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+    
+    def _init_sql(self):
+        self._sql_get_term = "SELECT * FROM terms WHERE term_code = ?"
+        self._sql_get_facet = "SELECT * FROM attributes WHERE code = ?"
+        self._sql_get_implicit_facets = """
+            SELECT facet_code, descriptor_code FROM implicit_facets
+            WHERE term_code = ? ORDER BY facet_order
+        """
+        self._sql_get_terms_in = "SELECT * FROM terms WHERE term_code IN ({})"
+        self._sql_get_facets_in = "SELECT * FROM attributes WHERE code IN ({})"
+        self._sql_get_facet_descriptors = """
+            SELECT t.term_code, t.extended_name, t.deprecated
+            FROM terms t
+            JOIN term_hierarchies th ON t.term_code = th.term_code
+            WHERE th.hierarchy_code = ?
+            ORDER BY th.term_order
+        """
+        # Point lookup of a single descriptor, used by validation so it does
+        # not need the whole descriptor list of the facet
+        self._sql_get_facet_descriptor = """
+            SELECT t.term_code, t.extended_name, t.deprecated
+            FROM term_hierarchies th
+            JOIN terms t ON t.term_code = th.term_code
+            WHERE th.term_code = ? AND th.hierarchy_code = ?
+            LIMIT 1
+        """
+        # Flattens one hierarchy into (ancestor, descendant, depth) rows,
+        # including each term as its own depth-0 ancestor, capped at 20 levels
+        self._sql_build_closure = """
+            INSERT INTO closure.term_closure (ancestor, descendant, depth, hierarchy_code)
+            WITH RECURSIVE clo(ancestor, descendant, depth) AS (
+                SELECT term_code, term_code, 0 FROM term_hierarchies
+                WHERE hierarchy_code = ?
+                UNION ALL
+                SELECT th.parent_code, clo.descendant, clo.depth + 1
+                FROM clo JOIN term_hierarchies th
+                    ON th.term_code = clo.ancestor AND th.hierarchy_code = ?
+                WHERE th.parent_code IS NOT NULL AND th.parent_code != ''
+                  AND clo.depth < 20
+            )
+            SELECT ancestor, descendant, depth, ? FROM clo
+        """
+        self._sql_get_ancestors = """
+            SELECT ancestor FROM closure.term_closure
+            WHERE descendant = ? AND hierarchy_code = ?
+            ORDER BY depth DESC
+        """
+        self._sql_search_terms_fts = """
+            SELECT
+                t.term_code,
+                t.extended_name,
+                t.common_names,
+                t.scientific_names,
+                t.term_type,
+                t.deprecated
+            FROM (
+                SELECT rowid, rank  -- rank is bm25() by default
+                FROM terms_fts WHERE terms_fts MATCH ?
+            ) m
+            JOIN terms t ON t.rowid = m.rowid
+            ORDER BY 
+                CASE WHEN t.term_code = ? THEN 0 ELSE 1 END,
+                CASE WHEN LOWER(t.extended_name) = LOWER(?) THEN 0 ELSE 1 END,
+                t.deprecated,
+                m.rank,
+                t.extended_name
+            LIMIT ?
+        """
+        # Substring scan used when the database has no terms_fts table
+        self._sql_search_terms = """
+            SELECT
+                t.term_code,
+                t.extended_name,
+                t.common_names,
+                t.scientific_names,
+                t.term_type,
+                t.deprecated
+            FROM terms t
+            WHERE (
+                t.term_code LIKE ? OR
+                LOWER(t.extended_name) LIKE LOWER(?) OR
+                LOWER(t.common_names) LIKE LOWER(?) OR
+                LOWER(t.scientific_names) LIKE LOWER(?)
+            )
+            ORDER BY 
+                CASE WHEN t.term_code = ? THEN 0 ELSE 1 END,
+                CASE WHEN LOWER(t.extended_name) = LOWER(?) THEN 0 ELSE 1 END,
+                t.deprecated,
+                t.extended_name
+            LIMIT ?
+        """
+        # Hierarchies are only looked up for the (at most limit) search hits
+        self._sql_get_term_hierarchies_in = """
+            SELECT term_code, GROUP_CONCAT(hierarchy_code) as hierarchies
+            FROM term_hierarchies
+            WHERE term_code IN ({})
+            GROUP BY term_code
+        """
+        self._sql_get_hierarchy_info = """
+            SELECT 
+                th.*,
+                p.extended_name as parent_name
+            FROM term_hierarchies th
+            LEFT JOIN terms p ON th.parent_code = p.term_code
+            WHERE th.term_code = ? AND th.hierarchy_code = ?
+        """
+    
+    def _ensure_indexes(self):
+        """Create any missing lookup indexes and refresh planner statistics"""
+        existing = {row[0] for row in self.conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index'")}
+        missing = [(name, target) for name, target in LOOKUP_INDEXES if name not in existing]
+        if not missing:
+            return
+        with self._transaction():
+            for name, target in missing:
+                self.conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+            self.conn.execute("ANALYZE")
+    
+    def _ensure_fts(self):
+        """Create and populate the terms_fts index if it does not exist yet"""
+        if self.conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'terms_fts'").fetchone():
+            return
+        try:
+            with self._transaction():
+                for statement in FTS_SCHEMA:
+                    self.conn.execute(statement)
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5; search_terms falls back to LIKE
+            pass
+    
+    def _implicit_facets_current(self) -> bool:
+        """Check the implicit_facets table and its triggers exist and cover the same terms as terms"""
+        names = self.conn.execute("""
+            SELECT COUNT(*) FROM sqlite_master WHERE name IN
+            ('implicit_facets', 'implicit_facets_ai', 'implicit_facets_ad', 'implicit_facets_au')
+        """).fetchone()[0]
+        if names < 4:
+            # Missing, or built before the triggers kept it in sync
+            return False
+        # Cheap staleness check in case terms was reloaded without it
+        expected = self.conn.execute("""
+            SELECT COUNT(*) FROM terms
+            WHERE implicit_facets IS NOT NULL AND implicit_facets != ''
+        """).fetchone()[0]
+        actual = self.conn.execute(
+            "SELECT COUNT(DISTINCT term_code) FROM implicit_facets").fetchone()[0]
+        return expected == actual
+    
+    def _build_implicit_facets(self):
+        """(Re)build the implicit_facets table from terms.implicit_facets"""
+        cursor = self.conn.execute("""
+            SELECT term_code, implicit_facets FROM terms
+            WHERE implicit_facets IS NOT NULL AND implicit_facets != ''
+        """)
+        rows = [(term_code, facet_code, descriptor_code, order)
+                for term_code, implicit_facets in cursor
+                for order, (facet_code, descriptor_code)
+                in enumerate(parse_implicit_facets(implicit_facets))]
+        with self._transaction():
+            for statement in IMPLICIT_FACETS_SCHEMA:
+                self.conn.execute(statement)
+            self.conn.execute("DELETE FROM implicit_facets")
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO implicit_facets VALUES (?, ?, ?, ?)", rows)
+    
+    def _init_closure(self):
+        """Attach an in-memory closure table for hierarchy path lookups"""
+        # Lives outside the catalogue file so it also works on read-only
+        # connections; each hierarchy is materialised on first use.
+        self.conn.execute("ATTACH DATABASE ':memory:' AS closure")
+        self.conn.execute("""
+            CREATE TABLE closure.term_closure (
+                ancestor TEXT,
+                descendant TEXT,
+                depth INTEGER,
+                hierarchy_code TEXT
+            )
+        """)
+        self.conn.execute("""
+            CREATE INDEX closure.idx_closure_descendant
+            ON term_closure(descendant, hierarchy_code, depth)
+        """)
+    
+    def _ensure_closure(self, hierarchy_code: str):
+        """Materialise the closure rows for a hierarchy if not done yet"""
+        shared = self._shared
+        if hierarchy_code in shared.closure_hierarchies:
+            return
+        with shared.lock:
+            if hierarchy_code in shared.closure_hierarchies:
+                return
+            self.conn.execute("PRAGMA query_only=OFF")
+            try:
+                self.conn.execute(self._sql_build_closure,
+                                  (hierarchy_code, hierarchy_code, hierarchy_code))
+            finally:
+                self.conn.execute("PRAGMA query_only=ON")
+            shared.closure_hierarchies.add(hierarchy_code)
+    
+    def _apply_pragmas(self):
+        """Tune the connection for read-mostly lookups"""
+        self.conn.execute("PRAGMA temp_store=MEMORY")
+        self.conn.execute("PRAGMA cache_size=-65536")  # 64MB page cache
+        self.conn.execute("PRAGMA mmap_size=268435456")  # 256MB
+        self.conn.execute("PRAGMA query_only=ON")
+    
+    def _init_caches(self):
+        """Memoize the per-code lookups that validation repeats for every code"""
+        # Bound to this instance so cached rows never outlive the connection.
+        # Cached values are immutable (read-only mappings and tuples); the
+        # public getters hand out fresh dicts so callers cannot corrupt them.
+        self._cached_term = lru_cache(maxsize=4096)(self._fetch_term)
+        self._cached_facet = lru_cache(maxsize=4096)(self._fetch_facet)
+        self._cached_facet_descriptors = lru_cache(maxsize=4096)(self._fetch_facet_descriptors)
+        self._descriptor_index = lru_cache(maxsize=4096)(self._build_descriptor_index)
+        self._cached_facet_descriptor = lru_cache(maxsize=16384)(self._fetch_facet_descriptor)
+        self._compiled_validator = lru_cache(maxsize=256)(self._build_validator)
+    
+    def invalidate_caches(self):
+        """
+        Drop this instance's memoized lookups and the shared closure table
+        Not enough after the database file was reloaded: other instances keep
+        their own caches, and the pooled connection keeps its FTS and
+        implicit_facets state. For that, call close_shared_connections() and
+        create a new FoodEx2Database.
+        """
+        self._cached_term.cache_clear()
+        self._cached_facet.cache_clear()
+        self._cached_facet_descriptors.cache_clear()
+        self._descriptor_index.cache_clear()
+        self._cached_facet_descriptor.cache_clear()
+        self._compiled_validator.cache_clear()
+        shared = self._shared
+        with shared.lock:
+            if shared.closure_hierarchies:
+                self.conn.execute("PRAGMA query_only=OFF")
+                try:
+                    self.conn.execute("DELETE FROM closure.term_closure")
+                finally:
+                    self.conn.execute("PRAGMA query_only=ON")
+                shared.closure_hierarchies.clear()
+    
+    def _fetch_term(self, term_code: str) -> Optional[Mapping]:
+        cursor = self.conn.execute(self._sql_get_term, (term_code,))
+        row = cursor.fetchone()
+        return MappingProxyType(dict(zip(_columns(cursor), row))) if row else None
+    
+    def _fetch_facet(self, facet_code: str) -> Optional[Mapping]:
+        cursor = self.conn.execute(self._sql_get_facet, (facet_code,))
+        row = cursor.fetchone()
+        return MappingProxyType(dict(zip(_columns(cursor), row))) if row else None
+    
+    def _fetch_facet_descriptors(self, facet_code: str) -> Tuple[Tuple, ...]:
+        # Plain (term_code, extended_name, deprecated) tuples; descriptor
+        # lists run to thousands of rows and most never leave this class
+        cursor = self.conn.execute(self._sql_get_facet_descriptors, (facet_code,))
+        return tuple(cursor.fetchall())
+    
+    def _build_descriptor_index(self, facet_code: str) -> Dict[str, Tuple]:
+        """Map descriptor code -> row tuple for a facet, for O(1) membership checks"""
+        return {row[0]: row for row in self._cached_facet_descriptors(facet_code)}
+    
+    def _fetch_facet_descriptor(self, facet_code: str, descriptor_code: str) -> Optional[Tuple]:
+        return self.conn.execute(self._sql_get_facet_descriptor,
+                                 (descriptor_code, facet_code)).fetchone()
+    
+    def _indexed_facet_descriptor(self, facet_code: str, descriptor_code: str) -> Optional[Tuple]:
+        return self._descriptor_index(facet_code).get(descriptor_code)
     
     def close(self):
-        self.conn.close()
+        """Release this instance; the pooled connection stays open for others"""
+        # Only the per-instance memos go; the closure table is shared
+        self._cached_term = None
+        self._cached_facet = None
+        self._cached_facet_descriptors = None
+        self._descriptor_index = None
+        self._cached_facet_descriptor = None
+        self._compiled_validator = None
+        self.conn = None
     
     def get_term(self, term_code: str) -> Optional[Dict]:
         """Get a term by its code"""
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            SELECT * FROM terms WHERE term_code = ?
-        """, (term_code,))
-        row = cursor.fetchone()
+        row = self._cached_term(term_code)
         return dict(row) if row else None
     
     def get_facet(self, facet_code: str) -> Optional[Dict]:
         """Get a facet/attribute by its code"""
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            SELECT * FROM attributes WHERE code = ?
-        """, (facet_code,))
-        row = cursor.fetchone()
+        row = self._cached_facet(facet_code)
         return dict(row) if row else None
     
     def is_valid_term(self, term_code: str) -> bool:
         """Check if a term code exists and is not deprecated"""
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            SELECT 1 FROM terms 
-            WHERE term_code = ? AND deprecated = 0
-        """, (term_code,))
-        return cursor.fetchone() is not None
+        # Shares the cached row with get_term instead of a separate query
+        row = self._cached_term(term_code)
+        return row is not None and not row['deprecated']
     
     def is_valid_facet(self, facet_code: str) -> bool:
         """Check if a facet code exists and is not deprecated"""
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            SELECT 1 FROM attributes 
-            WHERE code = ? AND deprecated = 0
-        """, (facet_code,))
-        return cursor.fetchone() is not None
+        row = self._cached_facet(facet_code)
+        return row is not None and not row['deprecated']
     
     def get_facet_descriptors(self, facet_code: str) -> List[Dict]:
-        """Get all valid descriptors for a facet"""
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            SELECT t.term_code, t.extended_name, t.deprecated
-            FROM terms t
-            JOIN term_hierarchies th ON t.term_code = th.term_code
-            WHERE th.hierarchy_code = ?
-            ORDER BY th.term_order
-        """, (facet_code,))
-        return [dict(row) for row in cursor.fetchall()]
+        """Get all valid descriptors for a facet (for listing; validation uses point lookups)"""
+        return [dict(zip(_DESCRIPTOR_FIELDS, row))
+                for row in self._cached_facet_descriptors(facet_code)]
     
     def get_implicit_facets(self, term_code: str) -> List[Tuple[str, str]]:
         """Get implicit facets for a term"""
-        term = self.get_term(term_code)
-        if not term or not term['implicit_facets']:
-            return []
+        if self.has_implicit_facets:
+            return self.conn.execute(self._sql_get_implicit_facets, (term_code,)).fetchall()
         
-        facets = []
-        # Parse format: F01.A059P$F27.A000A$F33.A0C4A
-        for facet_str in term['implicit_facets'].split('$'):
-            if '.' in facet_str:
-                facet_code, descriptor_code = facet_str.split('.', 1)
-                facets.append((facet_code, descriptor_code))
-        return facets
+        # Databases without the side table (opened read-only) parse the column
+        term = self._cached_term(term_code)
+        if not term:
+            return []
+        return list(parse_implicit_facets(term['implicit_facets']))
     
     def get_hierarchy_path(self, term_code: str, hierarchy_code: str) -> List[str]:
         """Get the full hierarchy path for a term"""
-        path = []
-        current_code = term_code
-        
-        cursor = self.conn.cursor()
-        max_depth = 20  # Prevent infinite loops
-        
-        while current_code and max_depth > 0:
-            cursor.execute("""
-                SELECT parent_code FROM term_hierarchies
-                WHERE term_code = ? AND hierarchy_code = ?
-            """, (current_code, hierarchy_code))
-            row = cursor.fetchone()
-            
-            if row and row['parent_code']:
-                path.insert(0, row['parent_code'])
-                current_code = row['parent_code']
-            else:
-                break
-            
-            max_depth -= 1
-        
-        path.append(term_code)
-        return path
+        self._ensure_closure(hierarchy_code)
+        cursor = self.conn.execute(self._sql_get_ancestors, (term_code, hierarchy_code))
+        # The closure includes the term itself at depth 0, so it comes last
+        path = [ancestor for ancestor, in cursor]
+        return path or [term_code]
     
     def validate_foodex2_code(self, code: str) -> Dict:
         """
         Validate a FoodEx2 code with facets
         Format: BASE#F01.DESC1$F02.DESC2
         """
+        return self._validate_code(code, self._cached_term, self._cached_facet,
+                                   self._cached_facet_descriptor)
+    
+    def compile_validator(self, pattern: Tuple[str, Tuple[str, ...]]) -> Callable[[str], Dict]:
+        """
+        Get a validator specialised for codes sharing one base term and facet set
+        pattern is (base_code, facet_codes), e.g. ("A01DJ", ("F28", "F01")) for
+        a column of A01DJ#F28.*$F01.* codes. The base term, facets and their
+        descriptor indexes are fetched once, so validating a matching code
+        needs no queries; codes outside the pattern fall back to the cached
+        per-code lookups. Results are identical to validate_foodex2_code.
+        """
+        base_code, facet_codes = pattern
+        return self._compiled_validator(base_code, tuple(facet_codes))
+    
+    def _build_validator(self, base_code: str, facet_codes: Tuple[str, ...]) -> Callable[[str], Dict]:
+        term = self._cached_term(base_code)
+        facets = {facet_code: self._cached_facet(facet_code) for facet_code in facet_codes}
+        indexes = {facet_code: self._descriptor_index(facet_code)
+                   for facet_code, facet in facets.items() if facet}
+        cached_term = self._cached_term
+        cached_facet = self._cached_facet
+        cached_facet_descriptor = self._cached_facet_descriptor
+        
+        def get_term(code):
+            return term if code == base_code else cached_term(code)
+        
+        def get_facet(facet_code):
+            return facets[facet_code] if facet_code in facets else cached_facet(facet_code)
+        
+        def get_descriptor(facet_code, descriptor_code):
+            index = indexes.get(facet_code)
+            if index is None:
+                return cached_facet_descriptor(facet_code, descriptor_code)
+            return index.get(descriptor_code)
+        
+        validate = self._validate_code
+        return lambda code: validate(code, get_term, get_facet, get_descriptor)
+    
+    def validate_many(self, codes: Iterable[str]) -> List[Dict]:
+        """
+        Validate a batch of FoodEx2 codes
+        Base terms and facets for the whole batch are fetched up front with
+        a few IN-list queries, so validation itself needs no per-code queries.
+        """
+        codes = list(codes)
+        
+        base_codes = set()
+        facet_codes = set()
+        for code in codes:
+            base_code, facet_pairs = _parse_code(code)
+            base_codes.add(base_code)
+            for facet_code, descriptor_code in facet_pairs:
+                if descriptor_code is not None:
+                    facet_codes.add(facet_code)
+        
+        # One read transaction so every lookup sees the same snapshot
+        with self._shared.lock, self._transaction():
+            terms = self._fetch_rows_in(self._sql_get_terms_in, base_codes, 'term_code')
+            facets = self._fetch_rows_in(self._sql_get_facets_in, facet_codes, 'code')
+            for facet_code in facets:
+                self._descriptor_index(facet_code)
+        
+        # Facets recur across the batch, so their full descriptor index
+        # (warmed above) beats a point query per descriptor here
+        return [self._validate_code(code, terms.get, facets.get, self._indexed_facet_descriptor)
+                for code in codes]
+    
+    def _fetch_rows_in(self, sql: str, keys: Set[str], key_column: str) -> Dict[str, Mapping]:
+        """Fetch rows whose key is in keys, chunked to stay under SQLite's parameter limit"""
+        keys = list(keys)
+        rows = {}
+        for i in range(0, len(keys), _IN_CHUNK_SIZE):
+            chunk = keys[i:i + _IN_CHUNK_SIZE]
+            cursor = self.conn.execute(sql.format(','.join('?' * len(chunk))), chunk)
+            columns = _columns(cursor)
+            for row in cursor:
+                row = MappingProxyType(dict(zip(columns, row)))
+                rows[row[key_column]] = row
+        return rows
+    
+    def _validate_code(self, code: str,
+                       get_term: Callable[[str], Optional[Mapping]],
+                       get_facet: Callable[[str], Optional[Mapping]],
+                       get_descriptor: Callable[[str, str], Optional[Tuple]]) -> Dict:
+        """Validate one code against the given term, facet and descriptor lookups"""
         result = {
             'valid': True,
             'errors': [],
@@ -118,116 +712,89 @@ class FoodEx2Database:
         }
         
         # Parse the code
-        if '#' in code:
-            base_code, facets_str = code.split('#', 1)
-        else:
-            base_code = code
-            facets_str = ''
+        base_code, facet_pairs = _parse_code(code)
         
-        # Validate base term
-        if not self.is_valid_term(base_code):
+        # Validate base term; deprecated terms are not valid base terms
+        term = get_term(base_code)
+        if term is None or term['deprecated']:
             result['valid'] = False
             result['errors'].append(f"Invalid base term code: {base_code}")
         else:
-            result['base_term'] = self.get_term(base_code)
-            
-            # Check if term is deprecated
-            if result['base_term']['deprecated']:
-                result['warnings'].append(f"Base term {base_code} is deprecated")
+            result['base_term'] = dict(term)
         
         # Parse and validate facets
-        seen_facets = set()
-        if facets_str:
-            facet_pairs = facets_str.split('$')
+        seen_facets = {}
+        for index, (facet_code, descriptor_code) in enumerate(facet_pairs):
+            if descriptor_code is None:
+                result['valid'] = False
+                result['errors'].append(f"Invalid facet format: {facet_code}")
+                continue
             
-            for facet_pair in facet_pairs:
-                if '.' not in facet_pair:
-                    result['valid'] = False
-                    result['errors'].append(f"Invalid facet format: {facet_pair}")
-                    continue
-                
-                facet_code, descriptor_code = facet_pair.split('.', 1)
-                
-                # Check if facet exists
-                facet = self.get_facet(facet_code)
-                if not facet:
-                    result['valid'] = False
-                    result['errors'].append(f"Invalid facet code: {facet_code}")
-                    continue
-                
-                # Check for duplicate facets
-                if facet_code in seen_facets and facet['single_or_repeatable'] == 'single':
-                    result['valid'] = False
-                    result['errors'].append(f"Facet {facet_code} can only appear once")
-                
-                seen_facets.add(facet_code)
-                
-                # Validate descriptor
-                descriptors = self.get_facet_descriptors(facet_code)
-                valid_descriptors = [d['term_code'] for d in descriptors if not d['deprecated']]
-                
+            # Check if facet exists
+            facet = get_facet(facet_code)
+            if not facet:
+                result['valid'] = False
+                result['errors'].append(f"Invalid facet code: {facet_code}")
+                continue
+            
+            # Check for duplicate facets; setdefault only returns a different
+            # position when the facet was already seen earlier in the code
+            if (seen_facets.setdefault(facet_code, index) != index
+                    and facet['single_or_repeatable'] == 'single'):
+                result['valid'] = False
+                result['errors'].append(f"Facet {facet_code} can only appear once")
+            
+            # Validate descriptor
+            descriptor = get_descriptor(facet_code, descriptor_code)
+            
+            # Deprecated descriptors are not valid choices for a facet
+            if descriptor is None or descriptor[2]:
                 descriptor = None
-                if descriptor_code not in valid_descriptors:
-                    result['valid'] = False
-                    result['errors'].append(f"Invalid descriptor {descriptor_code} for facet {facet_code}")
-                else:
-                    # Check if descriptor is deprecated
-                    descriptor = next((d for d in descriptors if d['term_code'] == descriptor_code), None)
-                    if descriptor and descriptor['deprecated']:
-                        result['warnings'].append(f"Descriptor {descriptor_code} is deprecated")
-                
-                result['facets'].append({
-                    'facet_code': facet_code,
-                    'facet_name': facet['name'],
-                    'descriptor_code': descriptor_code,
-                    'descriptor': descriptor
-                })
+                result['valid'] = False
+                result['errors'].append(f"Invalid descriptor {descriptor_code} for facet {facet_code}")
+            else:
+                descriptor = dict(zip(_DESCRIPTOR_FIELDS, descriptor))
+            
+            result['facets'].append({
+                'facet_code': facet_code,
+                'facet_name': facet['name'],
+                'descriptor_code': descriptor_code,
+                'descriptor': descriptor
+            })
         
-        # Check implicit facets
+        # Check implicit facets not already explicitly provided; the common
+        # case is that none are missing, so only then build the messages
         if result['base_term']:
-            implicit_facets = self.get_implicit_facets(base_code)
-            for imp_facet, imp_desc in implicit_facets:
-                # Check if implicit facet is already explicitly provided
-                if imp_facet not in seen_facets:
-                    result['warnings'].append(
-                        f"Term {base_code} has implicit facet {imp_facet}.{imp_desc} that could be made explicit"
-                    )
+            missing = [(imp_facet, imp_desc)
+                       for imp_facet, imp_desc in parse_implicit_facets(term['implicit_facets'])
+                       if imp_facet not in seen_facets]
+            if missing:
+                result['warnings'].extend(
+                    f"Term {base_code} has implicit facet {imp_facet}.{imp_desc} that could be made explicit"
+                    for imp_facet, imp_desc in missing)
         
         return result
     
     def search_terms(self, query: str, limit: int = 50) -> List[Dict]:
         """Search for terms by name or code"""
-        cursor = self.conn.cursor()
-        search_pattern = f'%{query}%'
-        
-        cursor.execute("""
-            SELECT DISTINCT
-                t.term_code,
-                t.extended_name,
-                t.common_names,
-                t.scientific_names,
-                t.term_type,
-                t.deprecated,
-                GROUP_CONCAT(th.hierarchy_code) as hierarchies
-            FROM terms t
-            LEFT JOIN term_hierarchies th ON t.term_code = th.term_code
-            WHERE (
-                t.term_code LIKE ? OR
-                LOWER(t.extended_name) LIKE LOWER(?) OR
-                LOWER(t.common_names) LIKE LOWER(?) OR
-                LOWER(t.scientific_names) LIKE LOWER(?)
-            )
-            GROUP BY t.term_code
-            ORDER BY 
-                CASE WHEN t.term_code = ? THEN 0 ELSE 1 END,
-                CASE WHEN LOWER(t.extended_name) = LOWER(?) THEN 0 ELSE 1 END,
-                t.deprecated,
-                t.extended_name
-            LIMIT ?
-        """, (search_pattern, search_pattern, search_pattern, search_pattern, 
-              query, query, limit))
+        match = _fts_prefix_query(query)
+        if self.has_fts and match:
+            cursor = self.conn.execute(self._sql_search_terms_fts,
+                                       (match, query, query, limit))
+        else:
+            search_pattern = f'%{query}%'
+            cursor = self.conn.execute(self._sql_search_terms, (
+                search_pattern, search_pattern, search_pattern, search_pattern,
+                query, query, limit))
+        columns = _columns(cursor)
+        results = [dict(zip(columns, row)) for row in cursor]
         
-        return [dict(row) for row in cursor.fetchall()]
+        hierarchies = self._fetch_rows_in(self._sql_get_term_hierarchies_in,
+                                          {term['term_code'] for term in results}, 'term_code')
+        for term in results:
+            row = hierarchies.get(term['term_code'])
+            term['hierarchies'] = row['hierarchies'] if row else None
+        return results
     
     def get_term_with_hierarchy(self, term_code: str, hierarchy_code: str = 'report') -> Dict:
         """Get full term information including hierarchy context"""
@@ -236,23 +803,14 @@ class FoodEx2Database:
             return None
         
         # Add hierarchy information
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            SELECT 
-                th.*,
-                p.extended_name as parent_name
-            FROM term_hierarchies th
-            LEFT JOIN terms p ON th.parent_code = p.term_code
-            WHERE th.term_code = ? AND th.hierarchy_code = ?
-        """, (term_code, hierarchy_code))
-        
+        cursor = self.conn.execute(self._sql_get_hierarchy_info, (term_code, hierarchy_code))
         hierarchy_info = cursor.fetchone()
         if hierarchy_info:
-            term['hierarchy_info'] = dict(hierarchy_info)
+            term['hierarchy_info'] = dict(zip(_columns(cursor), hierarchy_info))
             term['hierarchy_path'] = self.get_hierarchy_path(term_code, hierarchy_code)
         
         # Add implicit facets
-        term['implicit_facets_parsed'] = self.get_implicit_facets(term_code)
+        term['implicit_facets_parsed'] = list(parse_implicit_facets(term['implicit_facets']))
         
         return term
 
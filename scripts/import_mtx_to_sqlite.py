@@ -3,27 +3,48 @@
 Import MTX Excel file data into SQLite database for FoodEx2 validator
 """
 import pandas as pd
+from openpyxl import load_workbook
+from pandas.io.parsers import TextParser
 import sqlite3
 import os
+import re
 import json
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from itertools import repeat
+
+# Schema shared with the validator, which checks for these by name
+from foodex2_validator_queries import (
+    FTS_SCHEMA, IMPLICIT_FACETS_SCHEMA, LOOKUP_INDEXES,
+)
+
+try:
+    # Rust-based reader, several times faster than openpyxl on the term sheet
+    import python_calamine  # noqa: F401
+    EXCEL_ENGINE = 'calamine'
+except ImportError:
+    EXCEL_ENGINE = None  # pandas' default (openpyxl)
+
+try:
+    from tqdm import tqdm
+except ImportError:
+    def tqdm(iterable, **kwargs):
+        """No progress bars without tqdm; the import itself is unaffected"""
+        return iterable
+
+# One facet of a '$'-separated list: the code runs to the first '.', the
+# value to the next '$'; entries without a '.' are skipped
+FACET_RE = re.compile(r'(?:^|\$)([^$.]*)\.([^$]*)')
 
 def parse_term_facets(facets_str):
-    """Parse the facets string into a structured format"""
+    """Parse the facets string into a tuple of (code, value) pairs"""
     if pd.isna(facets_str) or not facets_str:
-        return []
+        return ()
     
-    facets = []
     # Parse format: A000A#F01.A059P$F02.A066Q$F27.A000A$F33.A0C4A
-    if '#' in facets_str:
-        parts = facets_str.split('#')
-        if len(parts) > 1:
-            facet_part = parts[1]
-            for facet in facet_part.split('$'):
-                if '.' in facet:
-                    facet_code, facet_value = facet.split('.', 1)
-                    facets.append({'code': facet_code, 'value': facet_value})
-    return facets
+    # (only the part between the first and any second '#' holds facets)
+    facet_part = facets_str.partition('#')[2].partition('#')[0]
+    return tuple(FACET_RE.findall(facet_part))
 
 def clean_boolean(value):
     """Convert various boolean representations to 0/1"""
@@ -53,17 +74,362 @@ def convert_date(value):
     except:
         return None
 
-def import_mtx_to_sqlite(excel_path, db_path):
+def clean_int(value):
+    """Convert a numeric cell to int, keeping blanks as NULL"""
+    if pd.isna(value):
+        return None
+    return int(value)
+
+# Whole-column versions of the cleaners above. Each gives the same values
+# as mapping the scalar cleaner over the column, and falls back to doing
+# exactly that for mixed-type columns.
+
+def map_column(values, clean):
+    """Apply a scalar cleaner cell by cell, keeping its results as-is"""
+    # Series.map would re-infer a dtype and turn None into NaN
+    return pd.Series([clean(value) for value in values], index=values.index, dtype=object)
+
+def clean_text_column(values):
+    """Vectorized clean_text"""
+    present = values.notna()
+    return values.astype(str).str.strip().astype(object).where(present, None)
+
+def clean_boolean_column(values):
+    """Vectorized clean_boolean"""
+    if pd.api.types.is_bool_dtype(values):
+        return values.astype(int)
+    if pd.api.types.is_numeric_dtype(values):
+        return (values > 0).astype(int)
+    return map_column(values, clean_boolean)
+
+def clean_int_column(values):
+    """Vectorized clean_int"""
+    if not pd.api.types.is_numeric_dtype(values):
+        return map_column(values, clean_int)
+    present = values.notna()
+    return values.fillna(0).astype('int64').astype(object).where(present, None)
+
+def convert_date_column(values):
+    """Vectorized convert_date"""
+    if pd.api.types.infer_dtype(values, skipna=True) != 'string':
+        return map_column(values, convert_date)
+    values = values.astype(object)
+    slashed = values.str.contains('/', regex=False, na=False)
+    # A handful of distinct dates cover most terms, so parse each string once
+    parsed = pd.to_datetime(values.where(slashed), format='%Y/%m/%d', errors='coerce', cache=True)
+    converted = values.where(~slashed, parsed.dt.strftime('%Y-%m-%dT%H:%M:%S').astype(object))
+    return converted.where(converted.notna() & (converted != ''), None)
+
+# Sheet column -> column cleaner for each table, in table column order
+CATALOGUE_COLUMNS = [
+    ('code', clean_text_column),
+    ('name', clean_text_column),
+    ('label', clean_text_column),
+    ('scopeNote', clean_text_column),
+    ('version', clean_text_column),
+    ('lastUpdate', convert_date_column),
+    ('validFrom', convert_date_column),
+    ('validTo', convert_date_column),
+    ('status', clean_text_column),
+    ('deprecated', clean_boolean_column),
+    ('termCodeMask', clean_text_column),
+    ('termCodeLength', clean_int_column),
+    ('termMinCode', clean_text_column),
+    ('acceptNonStandardCodes', clean_boolean_column),
+    ('generateMissingCodes', clean_boolean_column),
+    ('catalogueGroups', clean_text_column),
+]
+
+HIERARCHY_COLUMNS = [
+    ('code', clean_text_column),
+    ('name', clean_text_column),
+    ('label', clean_text_column),
+    ('scopeNote', clean_text_column),
+    ('hierarchyApplicability', clean_text_column),
+    ('hierarchyOrder', clean_int_column),
+    ('version', clean_text_column),
+    ('lastUpdate', convert_date_column),
+    ('validFrom', convert_date_column),
+    ('validTo', convert_date_column),
+    ('status', clean_text_column),
+    ('deprecated', clean_boolean_column),
+    ('hierarchyGroups', clean_text_column),
+]
+
+ATTRIBUTE_COLUMNS = [
+    ('code', clean_text_column),
+    ('name', clean_text_column),
+    ('label', clean_text_column),
+    ('scopeNote', clean_text_column),
+    ('attributeReportable', clean_text_column),
+    ('attributeVisible', clean_boolean_column),
+    ('attributeSearchable', clean_boolean_column),
+    ('attributeOrder', clean_int_column),
+    ('attributeType', clean_text_column),
+    ('attributeMaxLength', clean_int_column),
+    ('attributePrecision', clean_int_column),
+    ('attributeScale', clean_int_column),
+    ('attributeCatalogueCode', clean_text_column),
+    ('attributeSingleOrRepeatable', clean_text_column),
+    ('attributeInheritance', clean_text_column),
+    ('attributeUniqueness', clean_boolean_column),
+    ('attributeTermCodeAlias', clean_boolean_column),
+    ('version', clean_text_column),
+    ('lastUpdate', convert_date_column),
+    ('validFrom', convert_date_column),
+    ('validTo', convert_date_column),
+    ('status', clean_text_column),
+    ('deprecated', clean_boolean_column),
+]
+
+TERM_COLUMNS = [
+    ('termCode', clean_text_column),
+    ('termExtendedName', clean_text_column),
+    ('termShortName', clean_text_column),
+    ('termScopeNote', clean_text_column),
+    ('version', clean_text_column),
+    ('lastUpdate', convert_date_column),
+    ('validFrom', convert_date_column),
+    ('validTo', convert_date_column),
+    ('status', clean_text_column),
+    ('deprecated', clean_boolean_column),
+    ('scientificNames', clean_text_column),
+    ('commonNames', clean_text_column),
+    ('allFacets', clean_text_column),
+    ('implicitFacets', clean_text_column),
+    ('detailLevel', clean_text_column),
+    ('termType', clean_text_column),
+    ('ISSCAAP', clean_text_column),
+    ('taxonomicCode', clean_text_column),
+    ('alpha3Code', clean_text_column),
+    ('GEMSCode', clean_text_column),
+    ('matrixCode', clean_text_column),
+    ('LangualCode', clean_text_column),
+    ('foodexOldCode', clean_text_column),
+    ('prodTreat', clean_text_column),
+    ('prodMeth', clean_text_column),
+    ('prodPack', clean_text_column),
+    ('EuringsCode', clean_text_column),
+    ('IFNCode', clean_text_column),
+    ('EUFeedReg', clean_text_column),
+    ('EPPOCode', clean_text_column),
+    ('VectorNetCode', clean_text_column),
+    ('ADDFOODCode', clean_text_column),
+]
+
+RELEASE_NOTE_COLUMNS = [
+    ('operationName', clean_text_column),
+    ('operationDate', convert_date_column),
+    ('operationInfo', clean_text_column),
+    ('operationGroupId', clean_int_column),
+]
+
+def build_rows(df, columns):
+    """Clean a sheet column by column into row tuples ready for executemany"""
+    # tolist() hands back plain Python values, which is what sqlite3 binds
+    return list(zip(*(clean(df[name]).tolist() for name, clean in columns)))
+
+def build_term_hierarchy_rows(terms_df, hierarchy_names):
+    """Build term_hierarchies rows for every hierarchy a term is flagged in"""
+    # One pass per hierarchy over its own columns: mask the flagged terms,
+    # then clean just those rows column by column
+    term_codes = clean_text_column(terms_df['termCode'])
+    rows = []
+    for hier_name in hierarchy_names:
+        flags = terms_df[f'{hier_name}Flag']
+        flagged = (flags.notna() & flags.astype(bool)).to_numpy()
+        if not flagged.any():
+            continue
+        flagged_df = terms_df[flagged]
+        
+        def column(suffix, clean, default=None):
+            name = f'{hier_name}{suffix}'
+            if name not in flagged_df:
+                return repeat(default)
+            return clean(flagged_df[name]).tolist()
+        
+        rows.extend(zip(
+            term_codes[flagged].tolist(),
+            repeat(hier_name),
+            column('ParentCode', clean_text_column),
+            column('Order', clean_int_column),
+            column('Reportable', clean_boolean_column, 1),
+            clean_boolean_column(flags[flagged]).tolist(),
+            column('HierarchyCode', clean_text_column)
+        ))
+    return rows
+
+def insert_sql(table, columns):
+    """INSERT OR REPLACE statement with one placeholder per column"""
+    return f"INSERT OR REPLACE INTO {table} VALUES ({', '.join('?' * len(columns))})"
+
+# Statements are built once so every executemany reuses the same prepared
+# statement from the connection's cache
+SQL_INSERT_CATALOGUE = insert_sql('catalogue', CATALOGUE_COLUMNS)
+SQL_INSERT_HIERARCHY = insert_sql('hierarchies', HIERARCHY_COLUMNS)
+SQL_INSERT_ATTRIBUTE = insert_sql('attributes', ATTRIBUTE_COLUMNS)
+# terms columns filled from TERM_COLUMNS, in the same order; term_id is
+# left out so SQLite assigns it
+TERM_TABLE_COLUMNS = (
+    'term_code', 'extended_name', 'short_name', 'scope_note', 'version',
+    'last_update', 'valid_from', 'valid_to', 'status', 'deprecated',
+    'scientific_names', 'common_names', 'all_facets', 'implicit_facets',
+    'detail_level', 'term_type', 'ISSCAAP', 'taxonomic_code', 'alpha3_code',
+    'GEMS_code', 'matrix_code', 'langual_code', 'foodex_old_code',
+    'prod_treat', 'prod_meth', 'prod_pack', 'eurings_code', 'IFN_code',
+    'EU_feed_reg', 'EPPO_code', 'vector_net_code', 'ADDFOOD_code',
+)
+# Terms already in the database are updated in place so they keep their term_id
+SQL_INSERT_TERM = f'''
+    INSERT INTO terms ({', '.join(TERM_TABLE_COLUMNS)})
+    VALUES ({', '.join('?' * len(TERM_TABLE_COLUMNS))})
+    ON CONFLICT(term_code) DO UPDATE SET
+    {', '.join(f'{column} = excluded.{column}' for column in TERM_TABLE_COLUMNS[1:])}
+'''
+SQL_INSERT_TERM_HIERARCHY = 'INSERT OR REPLACE INTO term_hierarchies VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)'
+SQL_INSERT_RELEASE_NOTE = '''
+    INSERT INTO release_notes (operation_name, operation_date, operation_info, operation_group_id) 
+    VALUES (?, ?, ?, ?)
+'''
+
+# Lookup tables precomputed once at import time (these used to be views in
+# query_mtx_database.py, which re-ran the aggregation on every query)
+DERIVED_TABLES = (
+    ('searchable_terms', '''
+        SELECT
+            t.term_code,
+            t.extended_name,
+            t.short_name,
+            t.term_type,
+            t.detail_level,
+            t.deprecated,
+            t.status,
+            t.common_names,
+            t.scientific_names,
+            GROUP_CONCAT(DISTINCT th.hierarchy_code) as hierarchies,
+            GROUP_CONCAT(DISTINCT th.parent_code) as parent_codes
+        FROM terms t
+        LEFT JOIN term_hierarchies th ON t.term_code = th.term_code
+        GROUP BY t.term_code
+    ''', (
+        'CREATE UNIQUE INDEX idx_stm_code ON searchable_terms(term_code)',
+        'CREATE INDEX idx_stm_name ON searchable_terms(extended_name COLLATE NOCASE)',
+    )),
+    ('facet_descriptors', '''
+        SELECT 
+            t.term_code,
+            t.extended_name,
+            th.hierarchy_code as facet_code,
+            a.name as facet_name,
+            a.label as facet_label,
+            th.parent_code,
+            p.extended_name as parent_name
+        FROM terms t
+        JOIN term_hierarchies th ON t.term_id = th.term_id
+        JOIN attributes a ON th.hierarchy_code = a.code
+        LEFT JOIN terms p ON th.parent_id = p.term_id
+        WHERE a.attribute_type = 'catalogue'
+    ''', (
+        'CREATE INDEX idx_fd_term_facet ON facet_descriptors(term_code, facet_code)',
+    )),
+)
+
+SHEET_COLUMNS = {
+    'catalogue': CATALOGUE_COLUMNS,
+    'hierarchy': HIERARCHY_COLUMNS,
+    'attribute': ATTRIBUTE_COLUMNS,
+    'term': TERM_COLUMNS,
+    'releaseNotes': RELEASE_NOTE_COLUMNS,
+}
+
+def read_sheet(excel_path, sheet_name):
+    """Load one sheet as a DataFrame, typed the way pd.read_excel types it"""
+    if EXCEL_ENGINE:
+        return pd.read_excel(excel_path, sheet_name=sheet_name, engine=EXCEL_ENGINE)
+    
+    # Stream plain cell values; pd.read_excel's openpyxl reader builds a
+    # cell object per value first, which is most of its cost
+    workbook = load_workbook(excel_path, read_only=True, data_only=True)
+    try:
+        sheet = workbook[sheet_name]
+        sheet.reset_dimensions()  # the MTX export declares a bogus A1 dimension
+        # Blank cells as '' and whole-number floats as ints, as pandas does
+        rows = [
+            ['' if value is None else
+             int(value) if type(value) is float and value.is_integer() else value
+             for value in row]
+            for row in sheet.iter_rows(values_only=True)
+        ]
+    finally:
+        workbook.close()
+    
+    while rows and all(value == '' for value in rows[-1]):
+        rows.pop()
+    width = max((len(row) for row in rows), default=0)
+    rows = [row + [''] * (width - len(row)) for row in rows]
+    return TextParser(rows, header=0, skip_blank_lines=False).read()
+
+def parse_and_clean(excel_path, sheet_name):
+    """Read one sheet and clean it into row tuples; runs in a worker process"""
+    df = read_sheet(excel_path, sheet_name)
+    rows = build_rows(df, SHEET_COLUMNS[sheet_name])
+    if sheet_name != 'term':
+        return rows
+    
+    # Get hierarchy columns
+    hierarchy_cols = [col for col in df.columns if col.endswith('Flag')]
+    hierarchy_names = [col.replace('Flag', '') for col in hierarchy_cols]
+    return rows, build_term_hierarchy_rows(df, hierarchy_names)
+
+def import_mtx_to_sqlite(excel_path, db_path, max_workers=4):
     """Import MTX Excel data into SQLite database"""
     
     print(f"Loading Excel file: {excel_path}")
-    xl_file = pd.ExcelFile(excel_path)
+    # Sheets are parsed and cleaned in parallel while the schema is set up;
+    # the term sheet dominates, so it is submitted first
+    executor = ProcessPoolExecutor(max_workers=max_workers)
+    sheets = {
+        sheet_name: executor.submit(parse_and_clean, excel_path, sheet_name)
+        for sheet_name in ('term', 'catalogue', 'hierarchy', 'attribute', 'releaseNotes')
+    }
+    executor.shutdown(wait=False)
     
     # Create/connect to database
     print(f"Creating/connecting to database: {db_path}")
-    conn = sqlite3.connect(db_path)
+    # Transactions are managed explicitly: the whole import is one transaction
+    conn = sqlite3.connect(db_path, isolation_level=None)
     cursor = conn.cursor()
     
+    # Larger pages and no free-list bookkeeping. Both only apply to a new
+    # file, so an existing database is rebuilt with them first.
+    cursor.execute('PRAGMA page_size=8192')
+    cursor.execute('PRAGMA auto_vacuum=NONE')
+    if cursor.execute('PRAGMA page_count').fetchone()[0]:
+        page_size = cursor.execute('PRAGMA page_size').fetchone()[0]
+        if page_size != 8192:
+            # page_size cannot change while in WAL mode
+            cursor.execute('PRAGMA journal_mode=DELETE')
+            cursor.execute('VACUUM')
+    
+    # Bulk-load settings; nothing else uses the file until we're done
+    cursor.execute('PRAGMA mmap_size=268435456')  # 256MB
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=OFF')
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    cursor.execute('PRAGMA cache_size=-262144')  # 256MB page cache
+    cursor.execute('PRAGMA locking_mode=EXCLUSIVE')
+    cursor.execute('BEGIN')
+    
+    # Databases from before terms had an integer term_id are rebuilt: drop
+    # terms, term_hierarchies and everything derived from them. Their
+    # triggers and indexes go with the tables.
+    term_columns = {row[1] for row in cursor.execute('PRAGMA table_info(terms)')}
+    if term_columns and 'term_id' not in term_columns:
+        print("Dropping terms tables from an older schema...")
+        for table in ('terms_fts', *(table for table, _, _ in DERIVED_TABLES),
+                      'term_hierarchies', 'terms'):
+            cursor.execute(f'DROP TABLE IF EXISTS {table}')
+    
     # Create tables
     print("Creating database schema...")
     
@@ -140,7 +506,9 @@ def import_mtx_to_sqlite(excel_path, db_path):
     # Terms table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS terms (
-            term_code TEXT PRIMARY KEY,
+            -- Integer key for joins; term_code stays the public identifier
+            term_id INTEGER PRIMARY KEY,
+            term_code TEXT NOT NULL UNIQUE,
             extended_name TEXT NOT NULL,
             short_name TEXT,
             scope_note TEXT,
@@ -188,12 +556,20 @@ def import_mtx_to_sqlite(excel_path, db_path):
             reportable INTEGER DEFAULT 1,
             flag INTEGER DEFAULT 1,
             hierarchy_path TEXT,
+            -- terms.term_id of term_code and parent_code
+            term_id INTEGER,
+            parent_id INTEGER,
             PRIMARY KEY (term_code, hierarchy_code),
             FOREIGN KEY (term_code) REFERENCES terms(term_code),
             FOREIGN KEY (hierarchy_code) REFERENCES hierarchies(code)
         )
     ''')
     
+    # Implicit facets, pre-split from terms.implicit_facets by triggers as
+    # the terms are inserted
+    for statement in IMPLICIT_FACETS_SCHEMA:
+        cursor.execute(statement)
+    
     # Release notes table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS release_notes (
@@ -207,180 +583,47 @@ def import_mtx_to_sqlite(excel_path, db_path):
     
     # Import catalogue data
     print("\nImporting catalogue data...")
-    cat_df = pd.read_excel(xl_file, sheet_name='catalogue')
-    for _, row in cat_df.iterrows():
-        cursor.execute('''
-            INSERT OR REPLACE INTO catalogue VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            clean_text(row['code']),
-            clean_text(row['name']),
-            clean_text(row['label']),
-            clean_text(row['scopeNote']),
-            clean_text(row['version']),
-            convert_date(row['lastUpdate']),
-            convert_date(row['validFrom']),
-            convert_date(row['validTo']),
-            clean_text(row['status']),
-            clean_boolean(row['deprecated']),
-            clean_text(row['termCodeMask']),
-            int(row['termCodeLength']) if not pd.isna(row['termCodeLength']) else None,
-            clean_text(row['termMinCode']),
-            clean_boolean(row['acceptNonStandardCodes']),
-            clean_boolean(row['generateMissingCodes']),
-            clean_text(row['catalogueGroups'])
-        ))
-    print(f"  Imported {len(cat_df)} catalogue entries")
+    cat_rows = sheets['catalogue'].result()
+    cursor.executemany(SQL_INSERT_CATALOGUE, cat_rows)
+    print(f"  Imported {len(cat_rows)} catalogue entries")
     
     # Import hierarchies
     print("\nImporting hierarchies...")
-    hier_df = pd.read_excel(xl_file, sheet_name='hierarchy')
-    for _, row in hier_df.iterrows():
-        cursor.execute('''
-            INSERT OR REPLACE INTO hierarchies VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            clean_text(row['code']),
-            clean_text(row['name']),
-            clean_text(row['label']),
-            clean_text(row['scopeNote']),
-            clean_text(row['hierarchyApplicability']),
-            int(row['hierarchyOrder']) if not pd.isna(row['hierarchyOrder']) else None,
-            clean_text(row['version']),
-            convert_date(row['lastUpdate']),
-            convert_date(row['validFrom']),
-            convert_date(row['validTo']),
-            clean_text(row['status']),
-            clean_boolean(row['deprecated']),
-            clean_text(row['hierarchyGroups'])
-        ))
-    print(f"  Imported {len(hier_df)} hierarchies")
+    hier_rows = sheets['hierarchy'].result()
+    cursor.executemany(SQL_INSERT_HIERARCHY, hier_rows)
+    print(f"  Imported {len(hier_rows)} hierarchies")
     
     # Import attributes
     print("\nImporting attributes...")
-    attr_df = pd.read_excel(xl_file, sheet_name='attribute')
-    for _, row in attr_df.iterrows():
-        cursor.execute('''
-            INSERT OR REPLACE INTO attributes VALUES 
-            (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            clean_text(row['code']),
-            clean_text(row['name']),
-            clean_text(row['label']),
-            clean_text(row['scopeNote']),
-            clean_text(row['attributeReportable']),
-            clean_boolean(row['attributeVisible']),
-            clean_boolean(row['attributeSearchable']),
-            int(row['attributeOrder']) if not pd.isna(row['attributeOrder']) else None,
-            clean_text(row['attributeType']),
-            int(row['attributeMaxLength']) if not pd.isna(row['attributeMaxLength']) else None,
-            int(row['attributePrecision']) if not pd.isna(row['attributePrecision']) else None,
-            int(row['attributeScale']) if not pd.isna(row['attributeScale']) else None,
-            clean_text(row['attributeCatalogueCode']),
-            clean_text(row['attributeSingleOrRepeatable']),
-            clean_text(row['attributeInheritance']),
-            clean_boolean(row['attributeUniqueness']),
-            clean_boolean(row['attributeTermCodeAlias']),
-            clean_text(row['version']),
-            convert_date(row['lastUpdate']),
-            convert_date(row['validFrom']),
-            convert_date(row['validTo']),
-            clean_text(row['status']),
-            clean_boolean(row['deprecated'])
-        ))
-    print(f"  Imported {len(attr_df)} attributes")
+    attr_rows = sheets['attribute'].result()
+    cursor.executemany(SQL_INSERT_ATTRIBUTE, attr_rows)
+    print(f"  Imported {len(attr_rows)} attributes")
     
     # Import terms
     print("\nImporting terms...")
-    terms_df = pd.read_excel(xl_file, sheet_name='term')
+    term_rows, term_hierarchy_rows = sheets['term'].result()
     
-    # Get hierarchy columns
-    hierarchy_cols = [col for col in terms_df.columns if col.endswith('Flag')]
-    hierarchy_names = [col.replace('Flag', '') for col in hierarchy_cols]
+    # The implicit_facets triggers refill it as the terms go in
+    cursor.execute('DELETE FROM implicit_facets')
     
-    total_terms = len(terms_df)
-    batch_size = 1000
+    # One executemany per table; the progress bar advances as it consumes rows
+    cursor.executemany(SQL_INSERT_TERM, tqdm(term_rows, desc='  terms', unit=' rows'))
     
-    for i in range(0, total_terms, batch_size):
-        batch_df = terms_df.iloc[i:i+batch_size]
-        
-        for _, row in batch_df.iterrows():
-            # Insert term
-            cursor.execute('''
-                INSERT OR REPLACE INTO terms VALUES 
-                (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                clean_text(row['termCode']),
-                clean_text(row['termExtendedName']),
-                clean_text(row['termShortName']),
-                clean_text(row['termScopeNote']),
-                clean_text(row['version']),
-                convert_date(row['lastUpdate']),
-                convert_date(row['validFrom']),
-                convert_date(row['validTo']),
-                clean_text(row['status']),
-                clean_boolean(row['deprecated']),
-                clean_text(row['scientificNames']),
-                clean_text(row['commonNames']),
-                clean_text(row['allFacets']),
-                clean_text(row['implicitFacets']),
-                clean_text(row['detailLevel']),
-                clean_text(row['termType']),
-                clean_text(row['ISSCAAP']),
-                clean_text(row['taxonomicCode']),
-                clean_text(row['alpha3Code']),
-                clean_text(row['GEMSCode']),
-                clean_text(row['matrixCode']),
-                clean_text(row['LangualCode']),
-                clean_text(row['foodexOldCode']),
-                clean_text(row['prodTreat']),
-                clean_text(row['prodMeth']),
-                clean_text(row['prodPack']),
-                clean_text(row['EuringsCode']),
-                clean_text(row['IFNCode']),
-                clean_text(row['EUFeedReg']),
-                clean_text(row['EPPOCode']),
-                clean_text(row['VectorNetCode']),
-                clean_text(row['ADDFOODCode'])
-            ))
-            
-            # Insert hierarchy relationships
-            for hier_name in hierarchy_names:
-                flag_col = f'{hier_name}Flag'
-                parent_col = f'{hier_name}ParentCode'
-                order_col = f'{hier_name}Order'
-                reportable_col = f'{hier_name}Reportable'
-                hierarchy_code_col = f'{hier_name}HierarchyCode'
-                
-                if flag_col in row and not pd.isna(row[flag_col]) and row[flag_col]:
-                    cursor.execute('''
-                        INSERT OR REPLACE INTO term_hierarchies VALUES (?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        clean_text(row['termCode']),
-                        hier_name,
-                        clean_text(row.get(parent_col)),
-                        int(row[order_col]) if order_col in row and not pd.isna(row.get(order_col)) else None,
-                        clean_boolean(row.get(reportable_col, 1)),
-                        clean_boolean(row[flag_col]),
-                        clean_text(row.get(hierarchy_code_col))
-                    ))
-        
-        print(f"  Processed {min(i+batch_size, total_terms)}/{total_terms} terms...")
+    # Resolve codes to term ids now every term has one
+    term_ids = dict(cursor.execute('SELECT term_code, term_id FROM terms'))
+    cursor.executemany(SQL_INSERT_TERM_HIERARCHY, tqdm(
+        (row + (term_ids.get(row[0]), term_ids.get(row[2])) for row in term_hierarchy_rows),
+        total=len(term_hierarchy_rows), desc='  term hierarchies', unit=' rows'))
     
-    print(f"  Total imported: {total_terms} terms")
+    print(f"  Total imported: {len(term_rows)} terms")
+    implicit_count = cursor.execute('SELECT COUNT(*) FROM implicit_facets').fetchone()[0]
+    print(f"  Split out {implicit_count} implicit facets")
     
     # Import release notes
     print("\nImporting release notes...")
-    notes_df = pd.read_excel(xl_file, sheet_name='releaseNotes')
-    for _, row in notes_df.iterrows():
-        cursor.execute('''
-            INSERT INTO release_notes (operation_name, operation_date, operation_info, operation_group_id) 
-            VALUES (?, ?, ?, ?)
-        ''', (
-            clean_text(row['operationName']),
-            convert_date(row['operationDate']),
-            clean_text(row['operationInfo']),
-            int(row['operationGroupId']) if not pd.isna(row['operationGroupId']) else None
-        ))
-    print(f"  Imported {len(notes_df)} release notes")
+    notes_rows = sheets['releaseNotes'].result()
+    cursor.executemany(SQL_INSERT_RELEASE_NOTE, notes_rows)
+    print(f"  Imported {len(notes_rows)} release notes")
     
     # Create indexes
     print("\nCreating indexes...")
@@ -389,37 +632,51 @@ def import_mtx_to_sqlite(excel_path, db_path):
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_terms_status ON terms(status)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_term_hier_parent ON term_hierarchies(parent_code)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_term_hier_hierarchy ON term_hierarchies(hierarchy_code)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_th_parent_id ON term_hierarchies(parent_id)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_attributes_type ON attributes(attribute_type)')
+    # Covering indexes for the validator's lookups
+    for name, target in LOOKUP_INDEXES:
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {target}')
+    # LIKE is case-insensitive, so only a NOCASE index serves 'name%' prefix searches
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_terms_extname_nocase ON terms(extended_name COLLATE NOCASE)')
+    
+    # Materialize the derived lookup tables now the base tables are indexed
+    print("\nBuilding derived tables...")
+    for table, select, indexes in DERIVED_TABLES:
+        cursor.execute(f'DROP TABLE IF EXISTS {table}')
+        cursor.execute(f'CREATE TABLE {table} AS {select}')
+        for index in indexes:
+            cursor.execute(index)
+    
+    # Full-text search over term names, built in one go now the terms are loaded
+    print("\nBuilding full-text index...")
+    try:
+        for statement in FTS_SCHEMA:
+            cursor.execute(statement)
+    except sqlite3.OperationalError as e:
+        # SQLite built without FTS5; searches fall back to LIKE
+        print(f"  Skipped: {e}")
+    cursor.execute('ANALYZE')
     
-    # Commit and close
-    conn.commit()
-    conn.close()
+    # Commit
+    cursor.execute('COMMIT')
     
     print("\nImport complete!")
     print(f"Database created at: {db_path}")
     
-    # Print summary statistics
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
+    # Print summary statistics from the same connection, whose page cache
+    # still holds what the import just wrote
     print("\nDatabase summary:")
-    cursor.execute("SELECT COUNT(*) FROM catalogue")
-    print(f"  Catalogues: {cursor.fetchone()[0]}")
-    
-    cursor.execute("SELECT COUNT(*) FROM hierarchies")
-    print(f"  Hierarchies: {cursor.fetchone()[0]}")
-    
-    cursor.execute("SELECT COUNT(*) FROM attributes")
-    print(f"  Attributes: {cursor.fetchone()[0]}")
-    
-    cursor.execute("SELECT COUNT(*) FROM terms")
-    print(f"  Terms: {cursor.fetchone()[0]}")
-    
-    cursor.execute("SELECT COUNT(*) FROM term_hierarchies")
-    print(f"  Term-Hierarchy relationships: {cursor.fetchone()[0]}")
-    
-    cursor.execute("SELECT COUNT(*) FROM release_notes")
-    print(f"  Release notes: {cursor.fetchone()[0]}")
+    cursor.execute('''
+        SELECT 'Catalogues', COUNT(*) FROM catalogue
+        UNION ALL SELECT 'Hierarchies', COUNT(*) FROM hierarchies
+        UNION ALL SELECT 'Attributes', COUNT(*) FROM attributes
+        UNION ALL SELECT 'Terms', COUNT(*) FROM terms
+        UNION ALL SELECT 'Term-Hierarchy relationships', COUNT(*) FROM term_hierarchies
+        UNION ALL SELECT 'Release notes', COUNT(*) FROM release_notes
+    ''')
+    for label, count in cursor:
+        print(f"  {label}: {count}")
     
     conn.close()
 
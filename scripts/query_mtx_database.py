@@ -5,24 +5,25 @@ Example queries for the MTX SQLite database
 import sqlite3
 import json
 
-def run_query(conn, query, description):
-    """Run a query and display results"""
+def run_query(conn, query, description, max_rows=10):
+    """Run a query and display the first max_rows results, returning those rows"""
     print(f"\n{description}")
     print("-" * 80)
     cursor = conn.cursor()
     cursor.execute(query)
-    results = cursor.fetchall()
+    # Only the displayed rows are held in memory; the rest are just counted
+    results = cursor.fetchmany(max_rows)
     columns = [desc[0] for desc in cursor.description]
     
     if results:
         # Print header
         print(" | ".join(columns))
         print("-" * 80)
-        # Print first 10 results
-        for i, row in enumerate(results[:10]):
+        for row in results:
             print(" | ".join(str(val) if val is not None else "NULL" for val in row))
-        if len(results) > 10:
-            print(f"... and {len(results) - 10} more rows")
+        remaining = sum(1 for _ in cursor)
+        if remaining:
+            print(f"... and {remaining} more rows")
     else:
         print("No results found")
     
@@ -31,6 +32,7 @@ def run_query(conn, query, description):
 def main():
     db_path = "/Users/davidfoster/Dev/catalogue-browser/foodex2-validator/data/mtx.db"
     conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA mmap_size=268435456")  # 256MB; reads skip the page cache copy
     
     print("MTX Database Query Examples")
     print("=" * 80)
@@ -75,13 +77,26 @@ def main():
     """, "5. Terms by Type")
     
     # 6. Find apple-related terms
-    run_query(conn, """
-        SELECT term_code, extended_name, term_type, common_names
-        FROM terms
-        WHERE LOWER(extended_name) LIKE '%apple%' 
-           OR LOWER(common_names) LIKE '%apple%'
-        LIMIT 10
-    """, "6. Apple-related Terms")
+    has_fts = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'terms_fts'").fetchone() is not None
+    if has_fts:
+        # Word-prefix match through the full-text index instead of a table scan
+        run_query(conn, """
+            SELECT t.term_code, t.extended_name, t.term_type, t.common_names
+            FROM terms_fts f
+            JOIN terms t ON t.rowid = f.rowid
+            WHERE terms_fts MATCH '{extended_name common_names}: apple*'
+            LIMIT 10
+        """, "6. Apple-related Terms")
+    else:
+        # LIKE is already case-insensitive, no need for LOWER()
+        run_query(conn, """
+            SELECT term_code, extended_name, term_type, common_names
+            FROM terms
+            WHERE extended_name LIKE '%apple%' 
+               OR common_names LIKE '%apple%'
+            LIMIT 10
+        """, "6. Apple-related Terms")
     
     # 7. Terms with facets
     run_query(conn, """
@@ -93,20 +108,38 @@ def main():
     """, "7. Terms with Facets")
     
     # 8. Term hierarchy relationships
-    run_query(conn, """
-        SELECT 
-            t.term_code,
-            t.extended_name,
-            th.hierarchy_code,
-            th.parent_code,
-            p.extended_name as parent_name
-        FROM terms t
-        JOIN term_hierarchies th ON t.term_code = th.term_code
-        LEFT JOIN terms p ON th.parent_code = p.term_code
-        WHERE th.hierarchy_code = 'report'
-          AND th.parent_code IS NOT NULL
-        LIMIT 10
-    """, "8. Term Hierarchy Relationships (Reporting Hierarchy)")
+    th_columns = {row[1] for row in conn.execute("PRAGMA table_info(term_hierarchies)")}
+    if 'parent_id' in th_columns:
+        # Join on the integer term ids rather than comparing text codes
+        run_query(conn, """
+            SELECT 
+                t.term_code,
+                t.extended_name,
+                th.hierarchy_code,
+                th.parent_code,
+                p.extended_name as parent_name
+            FROM terms t
+            JOIN term_hierarchies th ON t.term_id = th.term_id
+            LEFT JOIN terms p ON th.parent_id = p.term_id
+            WHERE th.hierarchy_code = 'report'
+              AND th.parent_code IS NOT NULL
+            LIMIT 10
+        """, "8. Term Hierarchy Relationships (Reporting Hierarchy)")
+    else:
+        run_query(conn, """
+            SELECT 
+                t.term_code,
+                t.extended_name,
+                th.hierarchy_code,
+                th.parent_code,
+                p.extended_name as parent_name
+            FROM terms t
+            JOIN term_hierarchies th ON t.term_code = th.term_code
+            LEFT JOIN terms p ON th.parent_code = p.term_code
+            WHERE th.hierarchy_code = 'report'
+              AND th.parent_code IS NOT NULL
+            LIMIT 10
+        """, "8. Term Hierarchy Relationships (Reporting Hierarchy)")
     
     # 9. Recent release notes
     run_query(conn, """
@@ -133,50 +166,58 @@ def main():
         LIMIT 10
     """, "10. Terms with External Code Mappings")
     
-    # 11. Create a view for easy term searching
-    print("\n11. Creating Useful Views")
-    print("-" * 80)
+    # 11. Lookup tables for easy term searching
     cursor = conn.cursor()
-    
-    # View for searchable terms with hierarchy info
-    cursor.execute("""
-        CREATE VIEW IF NOT EXISTS v_searchable_terms AS
-        SELECT DISTINCT
-            t.term_code,
-            t.extended_name,
-            t.short_name,
-            t.term_type,
-            t.detail_level,
-            t.deprecated,
-            t.status,
-            t.common_names,
-            t.scientific_names,
-            GROUP_CONCAT(DISTINCT th.hierarchy_code) as hierarchies,
-            GROUP_CONCAT(DISTINCT th.parent_code) as parent_codes
-        FROM terms t
-        LEFT JOIN term_hierarchies th ON t.term_code = th.term_code
-        GROUP BY t.term_code
-    """)
-    
-    # View for facet descriptors
-    cursor.execute("""
-        CREATE VIEW IF NOT EXISTS v_facet_descriptors AS
-        SELECT 
-            t.term_code,
-            t.extended_name,
-            th.hierarchy_code as facet_code,
-            a.name as facet_name,
-            a.label as facet_label,
-            th.parent_code,
-            p.extended_name as parent_name
-        FROM terms t
-        JOIN term_hierarchies th ON t.term_code = th.term_code
-        JOIN attributes a ON th.hierarchy_code = a.code
-        LEFT JOIN terms p ON th.parent_code = p.term_code
-        WHERE a.attribute_type = 'catalogue'
-    """)
-    
-    print("Created views: v_searchable_terms, v_facet_descriptors")
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if {'searchable_terms', 'facet_descriptors'} <= tables:
+        # Materialized by import_mtx_to_sqlite.py, so no aggregation runs here
+        run_query(conn, """
+            SELECT 'searchable_terms' as name, COUNT(*) as count FROM searchable_terms
+            UNION ALL
+            SELECT 'facet_descriptors', COUNT(*) FROM facet_descriptors
+        """, "11. Precomputed Lookup Tables")
+    else:
+        print("\n11. Creating Useful Views")
+        print("-" * 80)
+        # View for searchable terms with hierarchy info
+        cursor.execute("""
+            CREATE VIEW IF NOT EXISTS v_searchable_terms AS
+            SELECT DISTINCT
+                t.term_code,
+                t.extended_name,
+                t.short_name,
+                t.term_type,
+                t.detail_level,
+                t.deprecated,
+                t.status,
+                t.common_names,
+                t.scientific_names,
+                GROUP_CONCAT(DISTINCT th.hierarchy_code) as hierarchies,
+                GROUP_CONCAT(DISTINCT th.parent_code) as parent_codes
+            FROM terms t
+            LEFT JOIN term_hierarchies th ON t.term_code = th.term_code
+            GROUP BY t.term_code
+        """)
+    
+        # View for facet descriptors
+        cursor.execute("""
+            CREATE VIEW IF NOT EXISTS v_facet_descriptors AS
+            SELECT 
+                t.term_code,
+                t.extended_name,
+                th.hierarchy_code as facet_code,
+                a.name as facet_name,
+                a.label as facet_label,
+                th.parent_code,
+                p.extended_name as parent_name
+            FROM terms t
+            JOIN term_hierarchies th ON t.term_code = th.term_code
+            JOIN attributes a ON th.hierarchy_code = a.code
+            LEFT JOIN terms p ON th.parent_code = p.term_code
+            WHERE a.attribute_type = 'catalogue'
+        """)
+    
+        print("Created views: v_searchable_terms, v_facet_descriptors")
     
     # 12. Example: Build a term with facets
     print("\n12. Example: Building a Term with Facets")